@@ -1,16 +1,20 @@
+import asyncio
 import os
 import time
 from typing import TypedDict, Annotated, List
+import orjson
 from dotenv import load_dotenv
 
 from langgraph.graph import StateGraph, END, START
 from langgraph.prebuilt import ToolNode
 from langgraph.graph.message import add_messages
-from langchain_core.rate_limiters import InMemoryRateLimiter
-from langchain_core.messages import trim_messages, HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain.chat_models import init_chat_model
 
-from shared_store import url_time
+import shared_store
+from shared_store import url_time, TIMEOUT_SUBMITTED_URLS
+from llm_cache import LLMCache
+from rate_limiter import TokenBucketRateLimiter
 from tools import (
     get_rendered_html, download_file, post_request,
     run_code, add_dependencies, ocr_image_tool, transcribe_audio, encode_image_to_base64
@@ -21,6 +25,7 @@ load_dotenv()
 USER_EMAIL = os.getenv("EMAIL")
 USER_SECRET = os.getenv("SECRET")
 
+MODEL_NAME = "gemini-2.5-flash"
 MAX_RECURSION_DEPTH = 5000
 TOKEN_LIMIT = 60000
 
@@ -41,19 +46,124 @@ AVAILABLE_TOOLS = [
 # -------------------------------------------------
 # LANGUAGE MODEL INITIALIZATION
 # -------------------------------------------------
-api_rate_limiter = InMemoryRateLimiter(
+api_rate_limiter = TokenBucketRateLimiter(
     requests_per_second=4 / 60,
-    check_every_n_seconds=1,
     max_bucket_size=4
 )
 
 language_model = init_chat_model(
     model_provider="google_genai",
-    model="gemini-2.5-flash",
+    model=MODEL_NAME,
     rate_limiter=api_rate_limiter
 ).bind_tools(AVAILABLE_TOOLS)
 
 
+# -------------------------------------------------
+# RESPONSE CACHE
+# -------------------------------------------------
+response_cache = LLMCache()
+BOUND_TOOL_NAMES = sorted(getattr(t, "name", getattr(t, "__name__", "")) for t in AVAILABLE_TOOLS)
+
+
+def is_tool_error(message) -> bool:
+    """
+    Tools report failures in their result instead of raising: an "Error..."
+    string, an {"error": ...} dict (get_rendered_html) or a non-zero
+    return_code (run_code).
+    """
+    if message.type != "tool":
+        return False
+    if getattr(message, "status", None) == "error":
+        return True
+    if not isinstance(message.content, str):
+        return False
+    if message.content.startswith("Error"):
+        return True
+    try:
+        tool_result = orjson.loads(message.content)
+    except orjson.JSONDecodeError:
+        return False
+    if not isinstance(tool_result, dict):
+        return False
+    return "error" in tool_result or tool_result.get("return_code", 0) != 0
+
+
+async def invoke_with_cache(context: List):
+    # Don't serve cached responses right after a failed tool call, the agent
+    # is expected to react to the error rather than repeat itself
+    if is_tool_error(context[-1]):
+        return await language_model.ainvoke(context)
+
+    serialized_context = [
+        {
+            "type": message.type,
+            "content": message.content,
+            "tool_calls": getattr(message, "tool_calls", None),
+        }
+        for message in context
+    ]
+    cache_key = LLMCache.cache_key(MODEL_NAME, serialized_context, BOUND_TOOL_NAMES)
+
+    cached_result = response_cache.get(cache_key)
+    if cached_result is not None:
+        print("--- LLM CACHE HIT ---")
+        # Fresh id so add_messages appends it instead of replacing the original
+        return cached_result.model_copy(update={"id": None})
+
+    result = await language_model.ainvoke(context)
+    # Responses that trigger a repair route (e.g. MALFORMED_FUNCTION_CALL)
+    # must not be replayed, or the retry loop would be locked in
+    if result.response_metadata.get("finish_reason") not in FINISH_REASON_ROUTES:
+        response_cache.set(cache_key, result)
+    return result
+
+
+# -------------------------------------------------
+# CONTEXT TRIMMING
+# -------------------------------------------------
+# Token counts are memoized per message so each message is only sent to the
+# tokenizer once, instead of re-counting the whole history every turn.
+_token_count_cache: dict[str, int] = {}
+
+
+async def count_message_tokens(message) -> int:
+    message_text = message.content if isinstance(message.content, str) else str(message.content)
+    message_tool_calls = getattr(message, "tool_calls", None)
+    if message_tool_calls:
+        message_text += str(message_tool_calls)
+
+    cache_key = f"{hash(message_text)}{message.type}"
+    token_count = _token_count_cache.get(cache_key)
+    if token_count is None:
+        # get_num_tokens is a blocking remote call, keep it off the event loop
+        token_count = await asyncio.to_thread(language_model.get_num_tokens, message_text)
+        _token_count_cache[cache_key] = token_count
+    return token_count
+
+
+async def trim_context(messages: List) -> List:
+    """
+    Keep the system message plus the newest messages that fit in TOKEN_LIMIT.
+    The kept history always starts on a human message.
+    """
+    system_message, history = messages[0], messages[1:]
+    remaining_tokens = TOKEN_LIMIT - await count_message_tokens(system_message)
+
+    # Walk backwards from the newest message until the budget runs out
+    start_index = len(history)
+    while start_index > 0:
+        remaining_tokens -= await count_message_tokens(history[start_index - 1])
+        if remaining_tokens < 0:
+            break
+        start_index -= 1
+
+    kept_history = history[start_index:]
+    for index, message in enumerate(kept_history):
+        if message.type == "human":
+            return [system_message] + kept_history[index:]
+    return [system_message]
+
+
 # -------------------------------------------------
 # SYSTEM PROMPT
 # -------------------------------------------------
@@ -79,6 +189,9 @@ Rules:
     secret = {USER_SECRET}
 """
 
+# Built once and reused as the first message of every run
+INITIAL_SYSTEM_MESSAGE = {"role": "system", "content": QUIZ_SYSTEM_PROMPT}
+
 
 # -------------------------------------------------
 # NEW NODE: HANDLE MALFORMED JSON
@@ -102,20 +215,74 @@ def handle_json_error_node(state: QuizAgentState):
 # -------------------------------------------------
 # AGENT NODE
 # -------------------------------------------------
-def quiz_processing_node(state: QuizAgentState):
+def find_submit_endpoint(messages: List):
+    """Return the URL of the most recent post_request call, if any."""
+    for message in reversed(messages):
+        for tool_call in getattr(message, "tool_calls", None) or ():
+            if tool_call["name"] == "post_request":
+                return tool_call["args"].get("url")
+    return None
+
+
+def last_submission_moved_on(messages: List) -> bool:
+    """
+    True if the most recent post_request result pointed at a next quiz URL.
+    "Tasks completed", HTTP errors and exceptions all return False.
+    """
+    for message in reversed(messages):
+        if message.type == "tool" and getattr(message, "name", None) == "post_request":
+            try:
+                submission_result = orjson.loads(message.content)
+            except (orjson.JSONDecodeError, TypeError):
+                return False
+            return isinstance(submission_result, dict) and bool(submission_result.get("url"))
+    return False
+
+
+async def quiz_processing_node(state: QuizAgentState):
     # --- TIME HANDLING START ---
     current_time = time.time()
-    current_url = os.getenv("url")
+    current_url = shared_store.current_url
     
     # SAFE GET: Prevents crash if url is None or not in dict
     previous_time = url_time.get(current_url) 
-    time_offset = os.getenv("offset", "0")
+    time_offset = shared_store.current_offset
 
     if previous_time is not None:
         previous_time = float(previous_time)
         time_difference = current_time - previous_time
 
-        if time_difference >= 180 or (time_offset != "0" and (current_time - float(time_offset)) > 90):
+        if time_difference >= 180 or (time_offset and (current_time - time_offset) > 90):
+            submit_endpoint = find_submit_endpoint(state["messages"])
+            # Synthesize at most once per quiz URL, and only while the quiz chain
+            # is still moving; otherwise the LLM decides (e.g. to output END)
+            if (
+                submit_endpoint is not None
+                and current_url not in TIMEOUT_SUBMITTED_URLS
+                and last_submission_moved_on(state["messages"])
+            ):
+                # The endpoint is already known, so skip the LLM round-trip and
+                # emit the wrong-answer submission directly
+                TIMEOUT_SUBMITTED_URLS.add(current_url)
+                print(f"Timeout exceeded ({time_difference}s) — submitting wrong answer directly.")
+                timeout_call = AIMessage(
+                    content="",
+                    tool_calls=[{
+                        "name": "post_request",
+                        "args": {
+                            "url": submit_endpoint,
+                            "payload": {
+                                "email": USER_EMAIL,
+                                "secret": USER_SECRET,
+                                "url": current_url,
+                                "answer": "__WRONG__"
+                            }
+                        },
+                        "id": f"timeout_{int(current_time)}"
+                    }]
+                )
+                return {"messages": [timeout_call]}
+
             print(f"Timeout exceeded ({time_difference}s) — instructing LLM to purposely submit wrong answer.")
 
             timeout_instruction = """
@@ -127,26 +294,20 @@ def quiz_processing_node(state: QuizAgentState):
             timeout_message = HumanMessage(content=timeout_instruction)
 
             # We invoke the LLM immediately with this new instruction
-            result = language_model.invoke(state["messages"] + [timeout_message])
+            result = await language_model.ainvoke(state["messages"] + [timeout_message])
             return {"messages": [result]}
     # --- TIME HANDLING END ---
 
-    trimmed_context = trim_messages(
-        messages=state["messages"],
-        max_tokens=TOKEN_LIMIT,
-        strategy="last",
-        include_system=True,
-        start_on="human",
-        token_counter=language_model, 
-    )
+    trimmed_context = await trim_context(state["messages"])
     
     # Better check: Does it have a HumanMessage?
-    has_human_message = any(msg.type == "human" for msg in trimmed_context)
+    # trim_context returns either [system] or [system, human, ...]
+    has_human_message = len(trimmed_context) > 1
     
     if not has_human_message:
         print("WARNING: Context was trimmed too far. Injecting state reminder.")
-        # We remind the agent of the current URL from the environment
-        current_quiz_url = os.getenv("url", "Unknown URL")
+        # We remind the agent of the current URL from the shared store
+        current_quiz_url = shared_store.current_url or "Unknown URL"
         context_reminder = HumanMessage(content=f"Context cleared due to length. Continue processing URL: {current_quiz_url}")
         
         # We append this to the trimmed list (temporarily for this invoke)
@@ -155,7 +316,7 @@ def quiz_processing_node(state: QuizAgentState):
 
     print(f"--- INVOKING AGENT (Context: {len(trimmed_context)} items) ---")
     
-    result = language_model.invoke(trimmed_context)
+    result = await invoke_with_cache(trimmed_context)
 
     return {"messages": [result]}
 
@@ -163,29 +324,47 @@ def quiz_processing_node(state: QuizAgentState):
 # -------------------------------------------------
 # ROUTING LOGIC (UPDATED FOR MALFORMED CALLS)
 # -------------------------------------------------
+END_SENTINEL = "END"
+# Finish reasons that override normal routing
+FINISH_REASON_ROUTES = {"MALFORMED_FUNCTION_CALL": "handle_malformed"}
+# Only text up to this length is stripped before comparing. Trade-off: END
+# padded with more than 29 whitespace characters is no longer detected
+MAX_END_TEXT_LENGTH = 32
+
+
+def is_end_text(text) -> bool:
+    if type(text) is not str:
+        return False
+    return text == END_SENTINEL or (len(text) <= MAX_END_TEXT_LENGTH and text.strip() == END_SENTINEL)
+
+
+def is_end_content(message_content) -> bool:
+    content_type = type(message_content)
+    if content_type is str:
+        return is_end_text(message_content)
+    if content_type is list and message_content:
+        first_block = message_content[0]
+        return type(first_block) is dict and "text" in first_block and is_end_text(first_block["text"])
+    return False
+
+
 def determine_next_step(state):
     last_message = state["messages"][-1]
-    
+
     # 1. CHECK FOR MALFORMED FUNCTION CALLS
-    if "finish_reason" in last_message.response_metadata:
-        if last_message.response_metadata["finish_reason"] == "MALFORMED_FUNCTION_CALL":
-            return "handle_malformed"
+    finish_route = FINISH_REASON_ROUTES.get(last_message.response_metadata.get("finish_reason"))
+    if finish_route is not None:
+        return finish_route
 
     # 2. CHECK FOR VALID TOOLS
-    available_tool_calls = getattr(last_message, "tool_calls", None)
-    if available_tool_calls:
+    if getattr(last_message, "tool_calls", None):
         print("Route → tools")
         return "tools"
 
     # 3. CHECK FOR END
-    message_content = getattr(last_message, "content", None)
-    if isinstance(message_content, str) and message_content.strip() == "END":
+    if is_end_content(getattr(last_message, "content", None)):
         return END
 
-    if isinstance(message_content, list) and len(message_content) and isinstance(message_content[0], dict):
-        if message_content[0].get("text", "").strip() == "END":
-            return END
-
     print("Route → agent")
     return "agent"
 
@@ -197,6 +376,7 @@ workflow_graph = StateGraph(QuizAgentState)
 
 # Add Nodes
 workflow_graph.add_node("agent", quiz_processing_node)
+# Under ainvoke, ToolNode runs all tool calls of one AIMessage concurrently
 workflow_graph.add_node("tools", ToolNode(AVAILABLE_TOOLS))
 workflow_graph.add_node("handle_malformed", handle_json_error_node) # Add the repair node
 
@@ -206,16 +386,13 @@ workflow_graph.add_edge("tools", "agent")
 workflow_graph.add_edge("handle_malformed", "agent") # Retry loop
 
 # Conditional Edges
-workflow_graph.add_conditional_edges(
-    "agent", 
-    determine_next_step,
-    {
-        "tools": "tools",
-        "agent": "agent",
-        "handle_malformed": "handle_malformed", # Map the new route
-        END: END
-    }
-)
+AGENT_ROUTES = {
+    "tools": "tools",
+    "agent": "agent",
+    "handle_malformed": "handle_malformed", # Map the new route
+    END: END
+}
+workflow_graph.add_conditional_edges("agent", determine_next_step, AGENT_ROUTES)
 
 compiled_app = workflow_graph.compile()
 
@@ -223,15 +400,11 @@ compiled_app = workflow_graph.compile()
 # -------------------------------------------------
 # EXECUTION RUNNER
 # -------------------------------------------------
-def run_agent(quiz_url: str):
+async def run_agent(quiz_url: str):
     # system message is seeded ONCE here
-    initial_message_stack = [
-        {"role": "system", "content": QUIZ_SYSTEM_PROMPT},
-        {"role": "user", "content": quiz_url}
-    ]
-
-    compiled_app.invoke(
-        {"messages": initial_message_stack},
+    # ainvoke so async tools (e.g. get_rendered_html) share the server's event loop
+    await compiled_app.ainvoke(
+        {"messages": [INITIAL_SYSTEM_MESSAGE, {"role": "user", "content": quiz_url}]},
         config={"recursion_limit": MAX_RECURSION_DEPTH}
     )
 
@@ -0,0 +1,44 @@
+import hashlib
+from collections import OrderedDict
+
+import orjson
+
+
+class LLMCache:
+    """
+    Exact-match cache for LLM responses.
+
+    Responses are keyed by a sha256 of the model name, the serialized
+    messages and the bound tool names, so a byte-identical context returns
+    the previous response without another API call. Holds at most
+    `max_entries` responses, evicting the least recently used.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.store = OrderedDict()
+
+    @staticmethod
+    def cache_key(model: str, messages: list, tools: list) -> str:
+        payload = {"model": model, "messages": messages, "tools": tools}
+        serialized = orjson.dumps(
+            payload,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+            default=str
+        )
+        return hashlib.sha256(serialized).hexdigest()
+
+    def get(self, key: str):
+        value = self.store.get(key)
+        if value is not None:
+            self.store.move_to_end(key)
+        return value
+
+    def set(self, key: str, value):
+        self.store[key] = value
+        self.store.move_to_end(key)
+        if len(self.store) > self.max_entries:
+            self.store.popitem(last=False)
+
+    def clear(self):
+        self.store.clear()
@@ -2,11 +2,15 @@ from fastapi import FastAPI, Request, BackgroundTasks
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from agent import run_agent
+from contextlib import asynccontextmanager
+from agent import run_agent, response_cache
+from tools.browser_pool import close_browser, warm_context_pool
+from tools.download_file import http_client
 from dotenv import load_dotenv
 import uvicorn
 import os
-from shared_store import url_time, BASE64_STORE
+import shared_store
+from shared_store import url_time, BASE64_STORE, RENDERED_HTML_CACHE, DOWNLOAD_CACHE, TIMEOUT_SUBMITTED_URLS
 import time
 
 load_dotenv()
@@ -14,7 +18,18 @@ load_dotenv()
 USER_EMAIL = os.getenv("EMAIL") 
 AUTH_SECRET = os.getenv("SECRET")
 
-application = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await warm_context_pool()
+    except Exception as error:
+        # Scrapes will open contexts lazily instead
+        print(f"Could not warm browser context pool: {error}")
+    yield
+    await close_browser()
+    await http_client.aclose()
+
+application = FastAPI(lifespan=lifespan)
 application.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # or specific domains
@@ -48,9 +63,13 @@ async def process_quiz_request(request: Request, background_tasks: BackgroundTas
         raise HTTPException(status_code=403, detail="Invalid secret")
     url_time.clear() 
     BASE64_STORE.clear()  
+    RENDERED_HTML_CACHE.clear()
+    DOWNLOAD_CACHE.clear()
+    TIMEOUT_SUBMITTED_URLS.clear()
+    response_cache.clear()
     print("Verified starting the task...")
-    os.environ["url"] = quiz_url
-    os.environ["offset"] = "0"
+    shared_store.current_url = quiz_url
+    shared_store.current_offset = 0.0
     url_time[quiz_url] = time.time()
     background_tasks.add_task(run_agent, quiz_url)
 
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import time
+
+from langchain_core.rate_limiters import BaseRateLimiter
+
+
+class TokenBucketRateLimiter(BaseRateLimiter):
+    """
+    Token bucket rate limiter for chat models.
+
+    Tokens refill continuously at `requests_per_second` up to
+    `max_bucket_size`. Acquiring returns immediately while a token is
+    available and otherwise sleeps exactly until the next one accrues.
+    """
+
+    def __init__(self, requests_per_second: float, max_bucket_size: float = 1):
+        self.requests_per_second = requests_per_second
+        self.max_bucket_size = max_bucket_size
+        self.available_tokens = max_bucket_size
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _consume(self) -> float:
+        """Take a token if available, else return the seconds until one is."""
+        with self._lock:
+            now = time.monotonic()
+            refill = (now - self.last_refill) * self.requests_per_second
+            self.available_tokens = min(self.max_bucket_size, self.available_tokens + refill)
+            self.last_refill = now
+
+            if self.available_tokens >= 1:
+                self.available_tokens -= 1
+                return 0.0
+            return (1 - self.available_tokens) / self.requests_per_second
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        wait_time = self._consume()
+        if not blocking:
+            return wait_time == 0.0
+        while wait_time > 0:
+            time.sleep(wait_time)
+            wait_time = self._consume()
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        wait_time = self._consume()
+        if not blocking:
+            return wait_time == 0.0
+        while wait_time > 0:
+            await asyncio.sleep(wait_time)
+            wait_time = self._consume()
+        return True
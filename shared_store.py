@@ -1,2 +1,11 @@
 BASE64_STORE = {}
-url_time = {}
\ No newline at end of file
+url_time = {}
+# Per-session tool result caches, cleared on every /solve
+RENDERED_HTML_CACHE = {}
+DOWNLOAD_CACHE = {}
+# Quiz URLs that already got a synthesized timeout submission this session
+TIMEOUT_SUBMITTED_URLS = set()
+
+# Quiz URL being solved and its retry offset (0.0 when not retrying)
+current_url = None
+current_offset = 0.0
@@ -1,10 +1,12 @@
 from typing import List
 from langchain_core.tools import tool
+import asyncio
 import subprocess
+from .run_code import restart_worker
 
 
 @tool
-def add_dependencies(dependencies: List[str]) -> str:
+async def add_dependencies(dependencies: List[str]) -> str:
     """
     Install the given Python packages into the environment.
 
@@ -19,12 +21,15 @@ def add_dependencies(dependencies: List[str]) -> str:
     """
 
     try:
-        subprocess.check_call(
+        await asyncio.to_thread(
+            subprocess.check_call,
             ["uv", "add"] + dependencies,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True
         )
+        # Restart the code worker so already-imported packages pick up upgrades
+        await restart_worker()
         return "Successfully installed dependencies: " + ", ".join(dependencies)
     
     except subprocess.CalledProcessError as e:
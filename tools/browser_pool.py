@@ -0,0 +1,117 @@
+import asyncio
+from collections import deque
+from playwright.async_api import async_playwright
+
+# A single Chromium instance is shared by every scrape. A small pool of
+# pre-opened contexts lets concurrent scrapes skip context creation; each
+# context is recycled after CONTEXT_MAX_USES pages to avoid state bleed.
+# _pool_condition guards _idle_contexts and _live_contexts.
+CONTEXT_POOL_SIZE = 4
+CONTEXT_MAX_USES = 20
+
+_playwright_instance = None
+_browser_instance = None
+_browser_lock = asyncio.Lock()
+_pool_condition = asyncio.Condition()
+_idle_contexts = deque()
+_context_uses = {}
+_live_contexts = 0
+
+
+async def get_browser():
+    """Return the shared browser, launching it on first use."""
+    global _playwright_instance, _browser_instance
+    async with _browser_lock:
+        if _browser_instance is None or not _browser_instance.is_connected():
+            if _playwright_instance is None:
+                _playwright_instance = await async_playwright().start()
+            _browser_instance = await _playwright_instance.chromium.launch(headless=True)
+    return _browser_instance
+
+
+async def _open_context():
+    """Open a context if the pool has room, else return None."""
+    global _live_contexts
+    async with _pool_condition:
+        if _live_contexts >= CONTEXT_POOL_SIZE:
+            return None
+        _live_contexts += 1
+    try:
+        browser_instance = await get_browser()
+        browser_context = await browser_instance.new_context()
+    except Exception:
+        async with _pool_condition:
+            _live_contexts -= 1
+            _pool_condition.notify_all()
+        raise
+    _context_uses[browser_context] = 0
+    return browser_context
+
+
+async def _return_context(browser_context):
+    async with _pool_condition:
+        _idle_contexts.append(browser_context)
+        _pool_condition.notify()
+
+
+async def _discard_context(browser_context):
+    global _live_contexts
+    _context_uses.pop(browser_context, None)
+    try:
+        await browser_context.close()
+    except Exception:
+        pass
+    async with _pool_condition:
+        _live_contexts -= 1
+        # Waiters re-check and open a context themselves if the pool has room
+        _pool_condition.notify_all()
+
+
+async def warm_context_pool():
+    """Launch the browser and fill the context pool ahead of the first scrape."""
+    while (browser_context := await _open_context()) is not None:
+        await _return_context(browser_context)
+
+
+async def acquire_context():
+    """Take an idle context, opening one if the pool isn't full yet."""
+    while True:
+        async with _pool_condition:
+            while not _idle_contexts and _live_contexts >= CONTEXT_POOL_SIZE:
+                await _pool_condition.wait()
+            if _idle_contexts:
+                return _idle_contexts.popleft()
+        browser_context = await _open_context()
+        if browser_context is not None:
+            return browser_context
+
+
+async def release_context(browser_context, reusable: bool = True):
+    """Return a context to the pool, replacing it if it is worn out or broken."""
+    _context_uses[browser_context] = _context_uses.get(browser_context, 0) + 1
+    if reusable and _context_uses[browser_context] < CONTEXT_MAX_USES:
+        await _return_context(browser_context)
+        return
+
+    await _discard_context(browser_context)
+    try:
+        replacement_context = await _open_context()
+    except Exception as error:
+        print(f"Could not replace browser context: {error}")
+        return
+    if replacement_context is not None:
+        await _return_context(replacement_context)
+
+
+async def close_browser():
+    """Shut down pooled contexts, the shared browser and the Playwright driver."""
+    global _playwright_instance, _browser_instance
+    while _idle_contexts:
+        await _discard_context(_idle_contexts.popleft())
+    async with _browser_lock:
+        if _browser_instance is not None:
+            await _browser_instance.close()
+            _browser_instance = None
+        if _playwright_instance is not None:
+            await _playwright_instance.stop()
+            _playwright_instance = None
@@ -0,0 +1,92 @@
+"""
+Persistent Python worker used by the run_code tool.
+
+The parent talks to the worker over two dedicated pipes whose fds are passed
+as arguments, leaving fds 0-2 to the executed code. Each request is a framed
+JSON object (utf-8 byte length on its own line, then the payload) holding the
+code and a per-run marker. fds 1 and 2 are pipes read by the parent, so output
+from child processes and C extensions is captured too. When a run ends the
+worker writes the marker to both, then replies with the return code on its
+own line.
+"""
+import importlib
+import json
+import os
+import sys
+import traceback
+
+
+def read_request(stream):
+    header = stream.readline()
+    if not header:
+        return None
+    return json.loads(stream.read(int(header)).decode("utf-8"))
+
+
+def end_run(marker: bytes):
+    """Flush the run's output and mark where it ends on fds 1 and 2."""
+    for stream in (sys.stdout, sys.stderr, sys.__stdout__, sys.__stderr__):
+        try:
+            stream.flush()
+        except (AttributeError, ValueError, OSError):
+            pass
+    os.write(1, marker)
+    os.write(2, marker)
+
+
+def execute(source_code: str, base_sys_path: list) -> int:
+    # Run as if launched with `python runner.py` from LLMFiles, not as the worker
+    sys.argv = ["runner.py"]
+    sys.path[:] = base_sys_path
+    namespace = {"__name__": "__main__", "__file__": "runner.py"}
+    try:
+        exec(compile(source_code, "runner.py", "exec"), namespace)
+    except SystemExit as exit_signal:
+        if exit_signal.code is None:
+            return 0
+        if isinstance(exit_signal.code, int):
+            # int() so sys.exit(True) replies 1 rather than "True"
+            return int(exit_signal.code)
+        print(exit_signal.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def main():
+    command_fd, result_fd = int(sys.argv[1]), int(sys.argv[2])
+    # Keep the protocol pipes away from processes started by the executed code
+    os.set_inheritable(command_fd, False)
+    os.set_inheritable(result_fd, False)
+    command_stream = os.fdopen(command_fd, "rb")
+    result_stream = os.fdopen(result_fd, "wb", buffering=0)
+
+    # input() and sys.stdin reads see EOF instead of blocking
+    stdin_fd = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(stdin_fd, 0)
+    os.close(stdin_fd)
+    working_directory = os.getcwd()
+    # sys.path[0] is the tools directory; scripts should import from LLMFiles instead
+    base_sys_path = [working_directory] + sys.path[1:]
+
+    while True:
+        request = read_request(command_stream)
+        if request is None:
+            break
+
+        # Undo side effects of the previous run and pick up newly added packages
+        os.chdir(working_directory)
+        importlib.invalidate_caches()
+        sys.stdout, sys.stderr, sys.stdin = sys.__stdout__, sys.__stderr__, sys.__stdin__
+
+        try:
+            return_code = execute(request["source_code"], base_sys_path)
+        finally:
+            end_run(request["marker"].encode("utf-8"))
+        result_stream.write(f"{return_code}\n".encode("utf-8"))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
 from langchain_core.tools import tool
-import requests
+import asyncio
+import httpx
 import os
+from shared_store import DOWNLOAD_CACHE
+
+# Shared client so repeated downloads from the same host reuse pooled
+# keep-alive connections instead of a new TCP+TLS handshake per call
+http_client = httpx.AsyncClient(timeout=30.0, follow_redirects=True)
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
 
 @tool
-def download_file(source_url: str, target_filename: str) -> str:
+async def download_file(source_url: str, target_filename: str) -> str:
     """
     Download a file from a URL and save it with the given filename
     in the current working directory.
@@ -15,17 +22,28 @@ def download_file(source_url: str, target_filename: str) -> str:
     Returns:
         str: Full path to the saved file.
     """
+    storage_directory = "LLMFiles"
+    file_path = os.path.join(storage_directory, target_filename)
+    # DOWNLOAD_CACHE maps a saved path to the URL that last wrote it successfully
+    if DOWNLOAD_CACHE.get(file_path) == source_url and os.path.exists(file_path):
+        return target_filename
+
+    # The write below truncates the file, so it no longer holds the cached content
+    DOWNLOAD_CACHE.pop(file_path, None)
     try:
-        http_response = requests.get(source_url, stream=True)
-        http_response.raise_for_status()
-        storage_directory = "LLMFiles"
-        os.makedirs(storage_directory, exist_ok=True)
-        file_path = os.path.join(storage_directory, target_filename)
-        with open(file_path, "wb") as file_handle:
-            for data_chunk in http_response.iter_content(chunk_size=8192):
-                if data_chunk:
-                    file_handle.write(data_chunk)
+        async with http_client.stream("GET", source_url) as http_response:
+            http_response.raise_for_status()
+            os.makedirs(storage_directory, exist_ok=True)
+            # Disk writes run in a worker thread so the event loop keeps
+            # serving other downloads while a chunk is flushed
+            file_handle = await asyncio.to_thread(open, file_path, "wb")
+            try:
+                async for data_chunk in http_response.aiter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    await asyncio.to_thread(file_handle.write, data_chunk)
+            finally:
+                await asyncio.to_thread(file_handle.close)
 
+        DOWNLOAD_CACHE[file_path] = source_url
         return target_filename
     except Exception as download_error:
-        return f"Error downloading file: {str(download_error)}"
\ No newline at end of file
+        return f"Error downloading file: {str(download_error)}"
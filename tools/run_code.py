@@ -1,5 +1,9 @@
 from google import genai
+import asyncio
+import json
+import signal
 import subprocess
+import uuid
 from langchain_core.tools import tool
 from dotenv import load_dotenv
 import os
@@ -17,15 +21,194 @@ def clean_code_formatting(source_code: str) -> str:
         source_code = source_code.rsplit("\n", 1)[0]
     return source_code.strip()
 
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_worker.py")
+CODE_TIMEOUT_SECONDS = 60
+OUTPUT_LIMIT = 10000
+# Captured bytes per stream; enough for OUTPUT_LIMIT characters of utf-8
+OUTPUT_BYTE_LIMIT = OUTPUT_LIMIT * 4
+worker_process = None
+worker_command_fd = None
+worker_result_reader = None
+worker_result_transport = None
+worker_lock = asyncio.Lock()
+
+
+async def start_worker():
+    global worker_process, worker_command_fd, worker_result_reader, worker_result_transport
+    os.makedirs("LLMFiles", exist_ok=True)
+    # Dedicated pipes for the protocol, fds 0-2 belong to the executed code
+    child_command_fd, command_fd = os.pipe()
+    result_fd, child_result_fd = os.pipe()
+    try:
+        worker_process = await asyncio.create_subprocess_exec(
+            "uv", "run", "python", "-u", WORKER_SCRIPT, str(child_command_fd), str(child_result_fd),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            pass_fds=(child_command_fd, child_result_fd),
+            cwd="LLMFiles",
+            # uv can't forward SIGKILL to its child, so the worker gets its own
+            # process group and the whole group is killed instead
+            start_new_session=True
+        )
+    except Exception:
+        os.close(command_fd)
+        os.close(result_fd)
+        raise
+    finally:
+        os.close(child_command_fd)
+        os.close(child_result_fd)
+
+    worker_command_fd = command_fd
+    worker_result_reader = asyncio.StreamReader()
+    worker_result_transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(worker_result_reader),
+        os.fdopen(result_fd, "rb", buffering=0)
+    )
+
+
+async def stop_worker():
+    """Kill the worker's process group. Caller must hold worker_lock."""
+    global worker_process, worker_command_fd, worker_result_reader, worker_result_transport
+    if worker_process is not None:
+        if worker_process.returncode is None:
+            try:
+                os.killpg(worker_process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        await worker_process.wait()
+    if worker_command_fd is not None:
+        os.close(worker_command_fd)
+    if worker_result_transport is not None:
+        worker_result_transport.close()
+    worker_process = None
+    worker_command_fd = None
+    worker_result_reader = None
+    worker_result_transport = None
+
+
+async def restart_worker():
+    """Stop the worker so the next run_code call starts a fresh one."""
+    async with worker_lock:
+        await stop_worker()
+
+
+def write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+class OutputLimitExceeded(Exception):
+    pass
+
+
+async def read_until_marker(stream, marker: bytes, captured: bytearray):
+    """
+    Collect a worker output stream into `captured` until the end-of-run
+    marker. Raises OutputLimitExceeded once more than OUTPUT_BYTE_LIMIT bytes
+    arrive, so a script printing in a loop can't exhaust memory.
+    """
+    search_start = 0
+    while True:
+        marker_index = captured.find(marker, search_start)
+        if marker_index != -1:
+            del captured[marker_index:]
+            return
+        if len(captured) > OUTPUT_BYTE_LIMIT + len(marker):
+            del captured[OUTPUT_BYTE_LIMIT:]
+            raise OutputLimitExceeded()
+        search_start = max(0, len(captured) - len(marker) + 1)
+        data_chunk = await stream.read(65536)
+        if not data_chunk:
+            raise RuntimeError("Code worker exited unexpectedly")
+        captured += data_chunk
+
+
+async def read_reply() -> int:
+    reply = await worker_result_reader.readline()
+    if not reply:
+        raise RuntimeError("Code worker exited unexpectedly")
+    try:
+        return int(reply)
+    except ValueError:
+        raise RuntimeError(f"Code worker sent an invalid reply: {reply!r}")
+
+
+async def exchange_with_worker(request: dict, captured_stdout: bytearray, captured_stderr: bytearray) -> int:
+    payload = json.dumps(request).encode("utf-8")
+    # Blocking pipe write, kept off the event loop
+    await asyncio.to_thread(write_all, worker_command_fd, f"{len(payload)}\n".encode("utf-8") + payload)
+
+    # stdout and stderr are drained together so neither pipe can fill up and stall the script
+    marker = request["marker"].encode("utf-8")
+    readers = [
+        asyncio.ensure_future(read_until_marker(worker_process.stdout, marker, captured_stdout)),
+        asyncio.ensure_future(read_until_marker(worker_process.stderr, marker, captured_stderr)),
+        asyncio.ensure_future(read_reply())
+    ]
+    try:
+        _, _, return_code = await asyncio.gather(*readers)
+    finally:
+        for reader in readers:
+            reader.cancel()
+    return return_code
+
+
+def decode_output(captured: bytearray) -> str:
+    return captured.decode("utf-8", errors="replace")[:OUTPUT_LIMIT]
+
+
+async def execute_in_worker(source_code: str):
+    if worker_process is None or worker_process.returncode is not None:
+        await stop_worker()
+        await start_worker()
+
+    request = {"source_code": source_code, "marker": f"<<run-end-{uuid.uuid4().hex}>>"}
+    captured_stdout, captured_stderr = bytearray(), bytearray()
+    status_note = ""
+    try:
+        return_code = await asyncio.wait_for(
+            exchange_with_worker(request, captured_stdout, captured_stderr),
+            timeout=CODE_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        # A hung script would block every later call, so the worker is replaced
+        await stop_worker()
+        return_code = -1
+        status_note = f"Execution timed out after {CODE_TIMEOUT_SECONDS} seconds."
+    except OutputLimitExceeded:
+        # Anything past the limit is discarded anyway, so stop the script now
+        await stop_worker()
+        return_code = -1
+        status_note = f"Execution stopped after printing more than {OUTPUT_LIMIT} characters."
+    except (OSError, RuntimeError):
+        # Worker exited mid-run (e.g. os._exit or a segfault) or broke the
+        # protocol; report its exit status if it has one and respawn on the
+        # next call
+        try:
+            return_code = await asyncio.wait_for(worker_process.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            return_code = -1
+        await stop_worker()
+
+    std_output = decode_output(captured_stdout)
+    std_error = decode_output(captured_stderr)
+
+    if status_note:
+        std_error = f"{std_error}\n{status_note}" if std_error else status_note
+    return std_output, std_error, return_code
+
+
 @tool
-def run_code(source_code: str) -> dict:
+async def run_code(source_code: str) -> dict:
     """
     Executes a Python code 
     This tool:
       1. Takes in python code as input
-      3. Writes code into a temporary .py file
-      4. Executes the file
-      5. Returns its output
+      2. Sends it to a persistent Python worker
+      3. Executes it in a fresh namespace (killed after 60 seconds)
+      4. Returns its output
 
     Parameters
     ----------
@@ -42,32 +225,21 @@ def run_code(source_code: str) -> dict:
         }
     """
     try: 
-        script_filename = "runner.py"
-        os.makedirs("LLMFiles", exist_ok=True)
-        with open(os.path.join("LLMFiles", script_filename), "w") as script_file:
-            script_file.write(source_code)
-
-        execution_process = subprocess.Popen(
-            ["uv", "run", script_filename],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd="LLMFiles"
-        )
-        std_output, std_error = execution_process.communicate()
-        if len(std_output) >= 10000:
-            return std_output[:10000] + "...truncated due to large size"
-        if len(std_error) >= 10000:
-            return std_error[:10000] + "...truncated due to large size"
+        async with worker_lock:
+            std_output, std_error, return_code = await execute_in_worker(source_code)
+        if len(std_output) >= OUTPUT_LIMIT:
+            return std_output[:OUTPUT_LIMIT] + "...truncated due to large size"
+        if len(std_error) >= OUTPUT_LIMIT:
+            return std_error[:OUTPUT_LIMIT] + "...truncated due to large size"
         # --- Step 4: Return everything ---
         return {
             "stdout": std_output,
             "stderr": std_error,
-            "return_code": execution_process.returncode
+            "return_code": return_code
         }
     except Exception as execution_error:
         return {
             "stdout": "",
             "stderr": str(execution_error),
             "return_code": -1
-        }
\ No newline at end of file
+        }
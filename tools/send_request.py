@@ -1,7 +1,7 @@
 from langchain_core.tools import tool
+import shared_store
 from shared_store import BASE64_STORE, url_time
 import time
-import os
 import requests
 import json
 from collections import defaultdict
@@ -40,7 +40,7 @@ def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str,
         payload["answer"] = BASE64_STORE[key]
     headers = headers or {"Content-Type": "application/json"}
     try:
-        cur_url = os.getenv("url")
+        cur_url = shared_store.current_url
         cache[cur_url] += 1
         sending = payload
         if isinstance(payload.get("answer"), str):
@@ -75,15 +75,15 @@ def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str,
                 print("Not retrying, moving on to the next question")
                 data = {"url": data.get("url", "")} 
             else: # Retry
-                os.environ["offset"] = str(url_time.get(next_url, time.time()))
+                shared_store.current_offset = float(url_time.get(next_url, time.time()))
                 print("Retrying..")
                 data["url"] = cur_url
                 data["message"] = "Retry Again!" 
         print("Formatted: \n", json.dumps(data, indent=4), '\n')
         forward_url = data.get("url", "")
-        os.environ["url"] = forward_url 
+        shared_store.current_url = forward_url
         if forward_url == next_url:
-            os.environ["offset"] = "0"
+            shared_store.current_offset = 0.0
 
         return data
     except requests.HTTPError as e:
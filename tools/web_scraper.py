@@ -1,37 +1,61 @@
 from langchain_core.tools import tool
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from shared_store import RENDERED_HTML_CACHE
+from .browser_pool import acquire_context, release_context
+
+MAX_HTML_LENGTH = 300000
 
 @tool
-def get_rendered_html(target_url: str) -> dict:
+async def get_rendered_html(target_url: str) -> dict:
     """
     Fetch and return the fully rendered HTML of a webpage.
     """
+    if target_url in RENDERED_HTML_CACHE:
+        print("\nUsing cached render of:", target_url)
+        return RENDERED_HTML_CACHE[target_url]
+
     print("\nFetching and rendering:", target_url)
     try:
-        with sync_playwright() as playwright_instance:
-            browser_instance = playwright_instance.chromium.launch(headless=True)
-            page_instance = browser_instance.new_page()
-
-            page_instance.goto(target_url, wait_until="networkidle")
-            html_content = page_instance.content()
+        browser_context = await acquire_context()
+        page_instance = None
+        context_reusable = True
+        try:
+            page_instance = await browser_context.new_page()
 
-            browser_instance.close()
+            await page_instance.goto(target_url, wait_until="domcontentloaded")
+            try:
+                await page_instance.wait_for_load_state("load", timeout=5000)
+            except PlaywrightTimeoutError:
+                pass
+            # Truncate inside the browser so at most MAX_HTML_LENGTH chars cross CDP
+            html_content, full_length = await page_instance.evaluate(
+                "(limit) => { const html = document.documentElement.outerHTML; return [html.slice(0, limit), html.length]; }",
+                MAX_HTML_LENGTH
+            )
+            # el.src is already resolved to an absolute URL by the browser
+            image_urls = await page_instance.eval_on_selector_all("img[src]", "els => els.map(e => e.src)")
+        except Exception:
+            context_reusable = False
+            raise
+        finally:
+            # Only the page is closed, the context goes back to the pool
+            if page_instance is not None:
+                try:
+                    await page_instance.close()
+                except Exception:
+                    context_reusable = False
+            await release_context(browser_context, context_reusable)
 
-            # Parse images
-            html_parser = BeautifulSoup(html_content, "html.parser")
-            image_urls = [urljoin(target_url, img["src"]) for img in html_parser.find_all("img", src=True)]
-            if len(html_content) > 300000:
-                    print("Warning: HTML too large, truncating...")
-                    html_content = html_content[:300000] + "... [TRUNCATED DUE TO SIZE]"
-            return {
-                "html": html_content,
-                "images": image_urls,
-                "url": target_url
-            }
+        if full_length > MAX_HTML_LENGTH:
+            print("Warning: HTML too large, truncating...")
+            html_content += "... [TRUNCATED DUE TO SIZE]"
+        rendered_page = {
+            "html": html_content,
+            "images": image_urls,
+            "url": target_url
+        }
+        RENDERED_HTML_CACHE[target_url] = rendered_page
+        return rendered_page
 
     except Exception as error:
         return {"error": f"Error fetching/rendering page: {str(error)}"}
-
-